@@ -9,19 +9,25 @@ Highlights
 * Optimistic‑concurrency control (StaleDataError handling)
 """
 
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+import flask
 from flask import (
     Flask, render_template, redirect, url_for,
-    request, flash
+    request, flash, g
 )
-from sqlalchemy import text
+from sqlalchemy import MetaData, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.orm import selectinload, raiseload, load_only
 from sqlalchemy.orm.exc import StaleDataError
 
 from models import db, Player, Team, Position
 from forms  import PlayerForm, TeamForm
 
-import flask
-print("Using Flask at:", flask.__file__)
-
 # ──────────────────────────
 # App configuration
 # ──────────────────────────
@@ -30,29 +36,199 @@ app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///roster.db"
 app.config["SECRET_KEY"] = "secret123"
 db.init_app(app)
 
+
+def strict(query):
+    """In debug mode, raise on any relationship that was not eager‑loaded."""
+    if app.debug:
+        query = query.options(raiseload("*"))
+    return query
+
+
+@contextmanager
+def write_transaction():
+    """Commit once on exit, roll back on error; no autoflush inside.
+
+    Same shape as ``session.begin()``, which can't be used here because the
+    request has usually autobegun a transaction (lookups, get_or_404) first.
+    """
+    try:
+        with db.session.no_autoflush:
+            yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+# ──────────────────────────
+# Cross‑request cache for dropdown lookups
+# ──────────────────────────
+LOOKUP_TTL   = 300          # seconds
+_cache       = {}           # key -> (loaded_at, rows)
+_cache_lock  = threading.RLock()      # re‑entrant: loaders may nest lookups
+
+
+def _cached(key, loader):
+    """Return rows for *key*, reloading via *loader* once the TTL expires."""
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and time.monotonic() - hit[0] < LOOKUP_TTL:
+            return hit[1]
+        rows = loader()
+        _cache[key] = (time.monotonic(), rows)
+        return rows
+
+
+def invalidate_cache(*keys):
+    """Drop cached lookups after a write to their table."""
+    with _cache_lock:
+        for key in keys:
+            _cache.pop(key, None)
+            g.pop(key, None)
+
+
+def get_teams_cached():
+    # Plain rows (not ORM objects) so they stay valid across sessions
+    return _cached("teams", lambda: db.session.execute(
+        select(Team.TeamID, Team.TeamName)).all())
+
+
+def get_positions_cached():
+    return _cached("positions", lambda: db.session.execute(
+        select(Position.PositionID, Position.PositionName)).all())
+
+
+# Ready‑made SelectField choices, built once per cached lookup
+def get_team_choices_cached():
+    return _cached("team_choices", lambda: tuple(
+        (t.TeamID, t.TeamName) for t in get_teams_cached()))
+
+
+def get_position_choices_cached():
+    return _cached("position_choices", lambda: tuple(
+        (p.PositionID, p.PositionName) for p in get_positions_cached()))
+
+
+# Per‑request memo in front of the TTL cache (no lock or clock per lookup)
+def refresh_team_choices(form):
+    """A write hit a team that's gone (deleted via another worker whose
+    cache we can't see); reload the teams and re‑offer the form."""
+    invalidate_cache("teams", "team_choices")
+    form.team.choices = get_team_choices_cached()
+    flash("The selected team no longer exists; please choose another.")
+
+
+def all_teams():
+    if "teams" not in g:
+        g.teams = get_teams_cached()
+    return g.teams
+
+
+def all_positions():
+    if "positions" not in g:
+        g.positions = get_positions_cached()
+    return g.positions
+
 # ──────────────────────────
 # One‑time bootstrap for empty DB
 # ──────────────────────────
-@app.before_request
-def run_once():
-    """Create tables & seed default positions the first time the app is hit."""
+DEFAULT_POSITIONS = ("Forward", "Midfielder", "Defender", "Goalkeeper")
+
+
+def _migrate_player_cascade():
+    """Rebuild a pre‑cascade player table so DELETE FROM team cascades.
+
+    create_all() never alters an existing table and SQLite can't change a
+    foreign key in place, so this follows SQLite's table‑rebuild recipe:
+    foreign keys off, create/copy/drop/rename in one explicit transaction,
+    foreign_key_check, commit, foreign keys back on.
+    """
+    # Build the new table's DDL under a temporary name, with its FK targets
+    # alongside so the constraints compile
+    meta = MetaData()
+    Team.__table__.to_metadata(meta)
+    Position.__table__.to_metadata(meta)
+    new_player = Player.__table__.to_metadata(meta, name="player_new")
+    dialect    = db.engine.dialect
+    create_sql = str(CreateTable(new_player).compile(dialect=dialect))
+    index_sql  = [str(CreateIndex(index).compile(dialect=dialect))
+                  for index in Player.__table__.indexes]
+    cols       = ", ".join(f'"{c.name}"' for c in Player.__table__.columns)
+
+    raw = db.engine.raw_connection()
+    con = raw.driver_connection
+    isolation, con.isolation_level = con.isolation_level, None   # manual BEGIN
+    try:
+        ddl = con.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'player'"
+        ).fetchone()
+        if ddl is None or "ON DELETE CASCADE" in ddl[0].upper():
+            return
+
+        con.execute("PRAGMA foreign_keys=OFF")   # no‑op inside a transaction
+        con.execute("BEGIN")
+        try:
+            con.execute(create_sql)
+            con.execute(f"INSERT INTO player_new ({cols}) "
+                        f"SELECT {cols} FROM player")
+            # Old DBs never enforced FKs; detach orphans rather than lose them
+            con.execute('UPDATE player_new SET "TeamID" = NULL '
+                        'WHERE "TeamID" NOT IN (SELECT "TeamID" FROM team)')
+            con.execute('UPDATE player_new SET "PositionID" = NULL '
+                        'WHERE "PositionID" NOT IN (SELECT "PositionID" FROM position)')
+            con.execute("DROP TABLE player")   # drops its indexes too
+            con.execute("ALTER TABLE player_new RENAME TO player")
+            for sql in index_sql:
+                con.execute(sql)
+            if con.execute("PRAGMA foreign_key_check").fetchall():
+                raise RuntimeError("player rebuild left foreign‑key violations")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.execute("PRAGMA foreign_keys=ON")
+        con.isolation_level = isolation
+        raw.close()
+
+
+def seed_db():
+    """Create tables & seed default positions if the DB is empty."""
+    db.create_all()
+    _migrate_player_cascade()
+    # idx_player_team was a prefix of idx_player_team_pos; drop it on old DBs
+    db.session.execute(text("DROP INDEX IF EXISTS idx_player_team"))
     if not Position.query.first():
-        db.create_all()
-        db.session.add_all([
-            Position(PositionName="Forward"),
-            Position(PositionName="Midfielder"),
-            Position(PositionName="Defender"),
-            Position(PositionName="Goalkeeper")
+        db.session.bulk_insert_mappings(Position, [
+            {"PositionName": name} for name in DEFAULT_POSITIONS
         ])
-        db.session.commit()
+    db.session.commit()
+
+
+# Runs once at import, so `flask run` and `python app.py` both bootstrap
+with app.app_context():
+    seed_db()
+
+
+@app.cli.command("show-flask")
+def show_flask():
+    """Print which Flask installation is in use."""
+    click.echo(flask.__file__)
 
 # ──────────────────────────
 # Home page
 # ──────────────────────────
 @app.route("/")
 def index():
-    players = Player.query.all()
-    teams   = Team.query.all()
+    # Eager‑load relationships the template touches (avoids N+1 SELECTs),
+    # and only the columns it renders (FKs are kept for the eager loads)
+    players = db.session.scalars(strict(select(Player).options(
+        load_only(Player.PlayerID, Player.Name, Player.TeamID, Player.PositionID),
+        selectinload(Player.team).load_only(Team.TeamName),
+        selectinload(Player.position).load_only(Position.PositionName)
+    ))).all()
+    teams   = db.session.scalars(strict(select(Team).options(
+        selectinload(Team.players).load_only(Player.PlayerID)
+    ))).all()
     return render_template("index.html", players=players, teams=teams)
 
 # ──────────────────────────
@@ -61,8 +237,8 @@ def index():
 @app.route("/add", methods=["GET", "POST"])
 def add_player():
     form = PlayerForm()
-    form.team.choices     = [(t.TeamID, t.TeamName)     for t in Team.query.all()]
-    form.position.choices = [(p.PositionID, p.PositionName) for p in Position.query.all()]
+    form.team.choices     = get_team_choices_cached()
+    form.position.choices = get_position_choices_cached()
 
     if form.validate_on_submit():
         player = Player(
@@ -72,8 +248,13 @@ def add_player():
             TeamID     = form.team.data,
             PositionID = form.position.data
         )
-        db.session.add(player)
-        db.session.commit()
+        try:
+            with write_transaction():
+                db.session.add(player)
+        except IntegrityError:
+            refresh_team_choices(form)
+            return render_template("add_player.html", form=form)
+        invalidate_report_cache()
         return redirect(url_for("index"))
     return render_template("add_player.html", form=form)
 
@@ -85,8 +266,9 @@ def add_team():
     form = TeamForm()
     if form.validate_on_submit():
         new_team = Team(TeamName=form.team_name.data)
-        db.session.add(new_team)
-        db.session.commit()
+        with write_transaction():
+            db.session.add(new_team)
+        invalidate_cache("teams", "team_choices")
         return redirect(url_for("index"))
     return render_template("add_team.html", form=form)
 
@@ -96,8 +278,9 @@ def add_team():
 @app.route("/delete/<int:player_id>", methods=["POST"])
 def delete_player(player_id):
     player = Player.query.get_or_404(player_id)
-    db.session.delete(player)
-    db.session.commit()
+    with write_transaction():
+        db.session.delete(player)
+    invalidate_report_cache()
     return redirect(url_for("index"))
 
 # ──────────────────────────
@@ -106,24 +289,27 @@ def delete_player(player_id):
 @app.route("/remove_teams", methods=["GET", "POST"])
 def remove_teams():
     if request.method == "POST" and request.form.get("action") == "delete_all":
-        Player.query.delete()
-        Team.query.delete()
-        db.session.commit()
+        # Whole‑table DELETEs; nothing is loaded into the session
+        with write_transaction():
+            db.session.execute(text("DELETE FROM player"))
+            db.session.execute(text("DELETE FROM team"))
+        invalidate_cache("teams", "team_choices")
+        invalidate_report_cache()
         return redirect(url_for("remove_teams"))
 
-    teams = Team.query.all()
+    teams = all_teams()
     return render_template("remove_teams.html", teams=teams)
 
 # ──────────────────────────
-# Delete single team (plus its players) via raw SQL
+# Delete single team (players go via ON DELETE CASCADE) via raw SQL
 # ──────────────────────────
 @app.route("/delete_team/<int:team_id>", methods=["POST"])
 def delete_team(team_id):
-    db.session.execute(text("DELETE FROM player WHERE TeamID = :team_id"),
-                       {"team_id": team_id})
-    db.session.execute(text("DELETE FROM team   WHERE TeamID = :team_id"),
-                       {"team_id": team_id})
-    db.session.commit()
+    with write_transaction():
+        db.session.execute(text("DELETE FROM team WHERE TeamID = :team_id"),
+                           {"team_id": team_id})
+    invalidate_cache("teams", "team_choices")
+    invalidate_report_cache()
     return redirect(url_for("remove_teams"))
 
 # ──────────────────────────
@@ -132,33 +318,122 @@ def delete_team(team_id):
 @app.route("/edit_player/<int:player_id>", methods=["GET", "POST"])
 def edit_player(player_id):
     player = Player.query.get_or_404(player_id)
-    teams = Team.query.all()
-    positions = Position.query.all()
+    # Keyword defaults only apply on GET; on POST the submitted data wins
+    form = PlayerForm(name=player.Name, age=player.Age, height=player.Height,
+                      team=player.TeamID, position=player.PositionID)
+    form.team.choices     = get_team_choices_cached()
+    form.position.choices = get_position_choices_cached()
 
-    if request.method == "POST":
+    if form.validate_on_submit():
         try:
-            player.Name = request.form["name"]
-            player.Age = int(request.form["age"])
-            player.Height = float(request.form["height"])
-            player.TeamID = int(request.form["team"])
-            player.PositionID = int(request.form["position"])
-            db.session.commit()
+            with write_transaction():
+                player.Name       = form.name.data
+                player.Age        = form.age.data
+                player.Height     = form.height.data
+                player.TeamID     = form.team.data
+                player.PositionID = form.position.data
+            invalidate_report_cache()
             return redirect(url_for("index"))
-        except Exception as e:
-            db.session.rollback()
+        except StaleDataError as e:
             flash(f"Error updating player: {e}")
             return redirect(url_for("edit_player", player_id=player_id))
+        except IntegrityError:
+            refresh_team_choices(form)
 
-    return render_template("edit_player.html", player=player, teams=teams, positions=positions)
+    return render_template("edit_player.html", form=form, player=player)
 
 
 # ──────────────────────────
 # Report (prepared‑statement query)
 # ──────────────────────────
+# Built once and keyed by (team filter?, position filter?) so each request
+# reuses the same statement objects instead of re‑assembling SQL strings.
+# Kept as four variants rather than one "(:id IS NULL OR col = :id)" query:
+# SQLite plans that form as a full scan and never uses idx_player_team_pos.
+_REPORT_WHERE = {
+    (False, False): "",
+    (True,  False): " WHERE TeamID = :team_id",
+    (False, True ): " WHERE PositionID = :position_id",
+    (True,  True ): " WHERE TeamID = :team_id AND PositionID = :position_id",
+}
+_REPORT_SQL = {
+    key: {
+        "rows": text("SELECT Name, Age, Height FROM player" + where),
+        "agg" : text("SELECT COUNT(*) AS total, AVG(Age) AS avg_age, "
+                     "AVG(Height) AS avg_height FROM player" + where),
+    }
+    for key, where in _REPORT_WHERE.items()
+}
+
+
+def _filter_id(value):
+    """Report filter value -> int ID, or None for "all"/missing."""
+    return int(value) if value and value != "all" else None
+
+
+def _run_report(params):
+    """Execute the report for *params*; returns (players, stats)."""
+    sql = _REPORT_SQL[(params["team_id"]     is not None,
+                       params["position_id"] is not None)]
+
+    # Let SQLite compute the summary instead of reducing rows in Python
+    agg = db.session.execute(sql["agg"], params).one()
+
+    if not agg.total:
+        return (), {"total": 0, "avg_age": 0, "avg_height": 0}
+
+    # Stats come from SQL above; rows are only fetched for the template to
+    # render, and kept as a tuple since cached_report() shares them
+    players = tuple(db.session.execute(sql["rows"], params))
+    stats   = {
+        "total"      : agg.total,
+        "avg_age"    : round(agg.avg_age,    2),
+        "avg_height" : round(agg.avg_height, 2),
+    }
+    return players, stats
+
+
+# Only the unfiltered all/all report is memoised: it is the common view and
+# its key can't be driven by form input. Entries expire after REPORT_TTL so
+# other worker processes pick up writes they didn't see; local writes clear
+# the cache at once. The generation counter stops a report computed before a
+# write from being stored after it.
+REPORT_TTL         = 30     # seconds
+_REPORT_ALL        = (None, None)
+_report_cache      = {}     # _REPORT_ALL -> (loaded_at, result)
+_report_generation = 0
+_report_lock       = threading.Lock()
+
+
+def invalidate_report_cache():
+    global _report_generation
+    with _report_lock:
+        _report_generation += 1
+        _report_cache.clear()
+
+
+def cached_report(params):
+    key = (params["team_id"], params["position_id"])
+    if key != _REPORT_ALL:
+        return _run_report(params)
+
+    with _report_lock:
+        hit        = _report_cache.get(key)
+        generation = _report_generation
+    if hit and time.monotonic() - hit[0] < REPORT_TTL:
+        return hit[1]
+
+    result = _run_report(params)
+    with _report_lock:
+        if generation == _report_generation:
+            _report_cache[key] = (time.monotonic(), result)
+    return result
+
+
 @app.route("/report", methods=["GET", "POST"])
 def report():
-    teams     = Team.query.all()
-    positions = Position.query.all()
+    teams     = all_teams()
+    positions = all_positions()
 
     players = None
     stats   = {}
@@ -167,34 +442,12 @@ def report():
         selected_team     = request.form.get("team")
         selected_position = request.form.get("position")
 
-        sql     = "SELECT * FROM player"
-        filters = []
-        params  = {}
-
-        if selected_team and selected_team != "all":
-            filters.append("TeamID = :team_id")
-            params["team_id"] = int(selected_team)
-
-        if selected_position and selected_position != "all":
-            filters.append("PositionID = :position_id")
-            params["position_id"] = int(selected_position)
-
-        if filters:
-            sql += " WHERE " + " AND ".join(filters)
-
-        result  = db.session.execute(text(sql), params)
-        players = result.fetchall()
-
-        if players:
-            ages    = [p.Age    for p in players]
-            heights = [p.Height for p in players]
-            stats   = {
-                "total"      : len(players),
-                "avg_age"    : round(sum(ages)    / len(ages), 2),
-                "avg_height" : round(sum(heights) / len(heights), 2),
-            }
-        else:
-            stats = {"total": 0, "avg_age": 0, "avg_height": 0}
+        # Always bind both; None means "all" and picks the unfiltered variant
+        params = {
+            "team_id"    : _filter_id(selected_team),
+            "position_id": _filter_id(selected_position),
+        }
+        players, stats = cached_report(params)
 
     return render_template("report.html",
                            players   = players,
@@ -206,16 +459,4 @@ def report():
 # Run the app
 # ──────────────────────────
 if __name__ == "__main__":
-        with app.app_context():
-            db.create_all()
-            # seed default positions only if missing
-            if not Position.query.first():
-                db.session.add_all([
-                    Position(PositionName="Forward"),
-                    Position(PositionName="Midfielder"),
-                    Position(PositionName="Defender"),
-                    Position(PositionName="Goalkeeper")
-                ])
-                db.session.commit()
-
-        app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
\ No newline at end of file
@@ -5,24 +5,46 @@ Key features
 ------------
 * Unique constraint on TeamName.
 * Lookup table for Position.
-* Player table with three performance indexes:
-    - idx_player_team        (TeamID)
+* Player table with two performance indexes:
     - idx_player_position    (PositionID)
-    - idx_player_team_pos    (TeamID, PositionID)
+    - idx_player_team_pos    (TeamID, PositionID), also serves TeamID lookups
 * Optimistic‑concurrency: Version column + mapper setting.
+* Deleting a team cascades to its players (ON DELETE CASCADE).
 """
 
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 db = SQLAlchemy()
 
 
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_con, _):
+    """Per‑connection SQLite tuning (FK enforcement is off by default)."""
+    if isinstance(dbapi_con, sqlite3.Connection):
+        cur = dbapi_con.cursor()
+        cur.execute("PRAGMA foreign_keys=ON")
+        cur.execute("PRAGMA journal_mode=WAL")       # readers don't block writers
+        cur.execute("PRAGMA synchronous=NORMAL")     # safe with WAL, fewer fsyncs
+        cur.execute("PRAGMA cache_size=-20000")      # ~20 MB page cache
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA mmap_size=268435456")    # 256 MB memory‑mapped I/O
+        cur.close()
+
+
 class Team(db.Model):
     __tablename__ = "team"
 
     TeamID   = db.Column(db.Integer, primary_key=True)
     TeamName = db.Column(db.String(100), nullable=False, unique=True)  # UNIQUE index
 
+    # passive_deletes: let the DB cascade instead of loading players first
+    players  = db.relationship("Player", back_populates="team",
+                               passive_deletes=True)
+
 
 class Position(db.Model):
     __tablename__ = "position"
@@ -30,13 +52,14 @@ class Position(db.Model):
     PositionID   = db.Column(db.Integer, primary_key=True)
     PositionName = db.Column(db.String(100), nullable=False)
 
+    players      = db.relationship("Player", back_populates="position")
+
 
 class Player(db.Model):
     __tablename__ = "player"
 
     __table_args__ = (
-        # Helpful indexes for report queries
-        db.Index("idx_player_team", "TeamID"),
+        # Helpful indexes for report queries (TeamID alone uses the composite)
         db.Index("idx_player_position", "PositionID"),
         db.Index("idx_player_team_pos", "TeamID", "PositionID"),
     )
@@ -45,7 +68,7 @@ class Player(db.Model):
     Name       = db.Column(db.String(100), nullable=False)
     Age        = db.Column(db.Integer,     nullable=False)
     Height     = db.Column(db.Float,       nullable=False)
-    TeamID     = db.Column(db.Integer, db.ForeignKey("team.TeamID"))
+    TeamID     = db.Column(db.Integer, db.ForeignKey("team.TeamID", ondelete="CASCADE"))
     PositionID = db.Column(db.Integer, db.ForeignKey("position.PositionID"))
 
     # ---------- optimistic‑concurrency column ----------
@@ -57,5 +80,5 @@ class Player(db.Model):
     }
 
     # Relationships
-    team     = db.relationship("Team",     backref="players")
-    position = db.relationship("Position", backref="players")
+    team     = db.relationship("Team",     back_populates="players")
+    position = db.relationship("Position", back_populates="players")